@@ -165,6 +165,98 @@ print(mean_sales_by_type_holiday)
 # Print the mean weekly_sales by department and type; fill missing values with 0s; sum all rows and cols
 print(sales.pivot_table(values="weekly_sales", index="department", columns="type", fill_value=0, margins=True))
 
+# Define an engine that groups the rows once and computes many statistics per group
+class GroupedStats:
+    """Factorize the group keys of df once, then compute every requested
+    statistic of a column in one pass over its rows grouped together."""
+
+    def __init__(self, df, by):
+        self.by = [by] if isinstance(by, str) else list(by)
+
+        # One integer code per row for the combination of the keys; rows with a missing key are left out
+        keys = df[self.by[0]] if len(self.by) == 1 else pd.MultiIndex.from_frame(df[self.by])
+        codes, self.groups = pd.factorize(keys, sort=True)
+        self.rows = np.flatnonzero(codes >= 0)
+        codes = codes[self.rows]
+
+        # Order the rows group by group and find where each group starts
+        self.order = self.rows[np.argsort(codes, kind='stable')]
+        self.sizes = np.bincount(codes, minlength=len(self.groups))
+        self.starts = np.concatenate(([0], np.cumsum(self.sizes)[:-1]))
+        self.df = df
+
+    def partials(self, column):
+        """Count, sum, min and max of column in each group, skipping NaNs."""
+        values = self.df[column].to_numpy(dtype='float64')[self.order]
+        valid = ~np.isnan(values)
+        count = np.add.reduceat(valid, self.starts)
+        total = np.add.reduceat(np.where(valid, values, 0), self.starts)
+        low = np.minimum.reduceat(np.where(valid, values, np.inf), self.starts)
+        high = np.maximum.reduceat(np.where(valid, values, -np.inf), self.starts)
+        empty = count == 0
+        low[empty] = np.nan
+        high[empty] = np.nan
+        return values, valid, count, total, low, high
+
+    def medians(self, values, valid):
+        # Select the middle element(s) of each group with np.partition instead of sorting it
+        medians = np.full(len(self.groups), np.nan)
+        for g, (start, size) in enumerate(zip(self.starts, self.sizes)):
+            group = values[start:start + size][valid[start:start + size]]
+            n = len(group)
+            if n:
+                half = n // 2
+                if n % 2:
+                    medians[g] = np.partition(group, half)[half]
+                else:
+                    part = np.partition(group, [half - 1, half])
+                    medians[g] = (part[half - 1] + part[half]) / 2
+        return medians
+
+    def agg(self, columns, stats=('min', 'max', 'mean', 'median')):
+        """Like df.groupby(by)[columns].agg(stats) for min, max, mean, median, sum and count."""
+        result = {}
+        for column in [columns] if isinstance(columns, str) else columns:
+            values, valid, count, total, low, high = self.partials(column)
+            computed = {'min': lambda: low, 'max': lambda: high, 'sum': lambda: total,
+                        'count': lambda: count,
+                        'mean': lambda: np.where(count > 0, total / np.maximum(count, 1), np.nan),
+                        'median': lambda: self.medians(values, valid)}
+            for stat in stats:
+                result[stat if isinstance(columns, str) else (column, stat)] = computed[stat]()
+        index = pd.Index(self.groups, name=self.by[0]) if len(self.by) == 1 else self.groups.set_names(self.by)
+        return pd.DataFrame(result, index=index)
+
+    def pivot_mean(self, values, fill_value=None, margins=False):
+        """Like pivot_table(values=values, index=by[0], columns=by[1], fill_value=fill_value,
+        margins=margins); the 'All' margins come from the per-cell sums and counts."""
+        _, _, count, total, _, _ = self.partials(values)
+        cells = pd.DataFrame({'sum': total, 'count': count},
+                             index=self.groups.set_names(self.by)).query('count > 0')
+        sums = cells['sum'].unstack(self.by[1])
+        counts = cells['count'].unstack(self.by[1])
+        table = sums / counts
+        if fill_value is not None:
+            table = table.fillna(fill_value)
+        if margins:
+            table['All'] = sums.sum(axis=1) / counts.sum(axis=1)
+            column_margin = sums.sum() / counts.sum()
+            column_margin['All'] = cells['sum'].sum() / cells['count'].sum()
+            table.loc['All'] = column_margin
+        return table
+
+# Factorize the store types once: sales_by_type
+sales_by_type = GroupedStats(sales, 'type')
+
+# For each store type, get min, max, mean, and median of weekly_sales
+print(sales_by_type.agg('weekly_sales'))
+
+# Get the same statistics of unemployment and fuel_price_usd_per_l without grouping again
+print(sales_by_type.agg(['unemployment', 'fuel_price_usd_per_l']))
+
+# Mean weekly_sales by department and type, filled with 0s and with margins from the cell sums
+print(GroupedStats(sales, ['department', 'type']).pivot_mean('weekly_sales', fill_value=0, margins=True))
+
 ############### Slicing and Indexing
 # Look at temperatures
 print(temperatures)
@@ -209,4 +209,491 @@ dow_bond = pd.merge_ordered(dji, bond_perc_close, on='date', how='inner',suffixe
 
 # Plot only the close_dow and close_bond columns
 dow_bond.plot(y=['close_dow','close_bond'], x='date', rot=90)
-plt.show()
\ No newline at end of file
+plt.show()
+
+# Import numpy as np and weakref
+import numpy as np
+import weakref
+
+# Define a hash index on one key column, built once and probed many times
+class JoinIndex:
+    """Hash index from the values of frame[key] to the
+    positions of the rows holding them."""
+
+    def __init__(self, frame, key):
+        # Factorize the keys; missing keys get a code of their own and match each other, as in merge
+        codes, uniques = pd.factorize(frame[key], use_na_sentinel=False)
+        self.keys = pd.Index(uniques)
+
+        # Group the row positions by code
+        self.order = np.argsort(codes, kind='stable')
+        self.counts = np.bincount(codes, minlength=len(uniques))
+        self.offsets = np.cumsum(self.counts) - self.counts
+
+    def lookup(self, values):
+        """Return the left and right row positions of every match of values."""
+        codes = self.keys.get_indexer(values)
+        found = codes >= 0
+        counts = np.where(found, self.counts[codes], 0)
+
+        # Repeat each left position once per match, and walk each match range
+        left_pos = np.repeat(np.arange(len(codes)), counts)
+        starts = np.repeat(np.where(found, self.offsets[codes], 0), counts)
+        steps = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return left_pos, self.order[starts + steps], found
+
+# Define a cache of join indexes that drops an index when its frame changes
+class JoinIndexCache:
+    """Keep one JoinIndex per (frame, key) and rebuild it only when
+    the frame's shape, columns or key values change."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def fingerprint(self, frame, key):
+        # Hash every key value: still O(n), but cheaper than the factorize and sort of a rebuild
+        return (frame.shape, tuple(frame.columns),
+                int(pd.util.hash_pandas_object(frame[key], index=False).sum()))
+
+    def index(self, frame, key):
+        entry_key = (id(frame), key)
+        fingerprint = self.fingerprint(frame, key)
+        entry = self.entries.get(entry_key)
+        if entry is None or entry[0] != fingerprint:
+            # Forget the index when frame is garbage collected, so its id can be reused
+            if entry is None:
+                weakref.finalize(frame, self.entries.pop, entry_key, None)
+            entry = (fingerprint, JoinIndex(frame, key))
+            self.entries[entry_key] = entry
+        return entry[1]
+
+    def invalidate(self, frame):
+        # Drop every index built on frame, e.g. after editing its values in place
+        for entry_key in [k for k in self.entries if k[0] == id(frame)]:
+            del self.entries[entry_key]
+
+    def merge(self, left, right, on, how='inner', suffixes=('_x', '_y')):
+        """Merge left with right on the key column on, like
+        left.merge(right, on=on, how=how), using the cached index of right."""
+        left_pos, right_pos, found = self.index(right, on).lookup(left[on])
+
+        # Keep unmatched left rows once for a left join, with no right position
+        if how == 'left':
+            missing = np.flatnonzero(~found)
+            order = np.argsort(np.concatenate([left_pos, missing]), kind='stable')
+            left_pos = np.concatenate([left_pos, missing])[order]
+            right_pos = np.concatenate([right_pos, np.full(len(missing), -1)])[order]
+        elif how != 'inner':
+            raise ValueError("how must be 'inner' or 'left', not {!r}".format(how))
+
+        # Suffix the non-key columns found in both tables
+        right_cols = [col for col in right.columns if col != on]
+        overlap = set(left.columns) & set(right_cols)
+        left_part = left.take(left_pos).reset_index(drop=True)
+        left_part.columns = [col + suffixes[0] if col in overlap else col for col in left.columns]
+        right_part = right[right_cols].reset_index(drop=True).reindex(right_pos).reset_index(drop=True)
+        right_part.columns = [col + suffixes[1] if col in overlap else col for col in right_cols]
+        return pd.concat([left_part, right_part], axis=1)
+
+# Create one cache for the whole script: join_cache
+join_cache = JoinIndexCache()
+
+# Merge the taxi_owners and taxi_veh tables using the cached index on vid
+taxi_own_veh = join_cache.merge(taxi_owners, taxi_veh, on='vid')
+
+# Merge licenses and zip_demo on zip, then the wards on ward
+licenses_zip_ward = join_cache.merge(join_cache.merge(licenses, zip_demo, on='zip'), wards, on='ward')
+
+# Merge land_use and census, then licenses, building the indexes on census and licenses
+land_cen_lic = join_cache.merge(join_cache.merge(land_use, census, on='ward'), licenses, on='ward', suffixes=('_cen', '_lic'))
+
+# Merge the wards and census tables, reusing the index already built on census
+wards_census = join_cache.merge(wards, census, on='ward')
+print('wards_census table shape:', wards_census.shape)
+
+# Define a lazy plan that collects inner joins and a final aggregation
+class JoinPlan:
+    """Collect inner joins on a base table and a final groupby/agg,
+    then run them in the cheapest order on only the needed columns."""
+
+    def __init__(self, base):
+        self.base = base
+        self.joins = []
+        self.by = None
+        self.spec = None
+
+    def merge(self, right, on, suffixes=('_x', '_y')):
+        self.joins.append((right, on, suffixes))
+        return self
+
+    def agg(self, by, spec):
+        self.by = [by] if isinstance(by, str) else list(by)
+        self.spec = spec
+        return self
+
+    def key_tables(self):
+        """For each join, the positions (0 is the base) of the table that
+        provides its key in the eager left-to-right order and of its right table."""
+        tables = [self.base] + [right for right, _, _ in self.joins]
+        pairs = []
+        for i, (_, on, _) in enumerate(self.joins):
+            provider = next((j for j in range(i + 1) if on in tables[j].columns), None)
+            if provider is None:
+                raise KeyError('no join key {!r} in the tables before its join'.format(on))
+            pairs.append((provider, i + 1))
+        return pairs
+
+    def prune(self, frame, position, pairs):
+        # Keep the join keys of the joins this table takes part in
+        keys = {on for (_, on, _), pair in zip(self.joins, pairs) if position in pair}
+        if self.spec is None:
+            return frame
+
+        # And the columns the aggregation reads, under their own name or a suffixed one
+        names = set(self.by) | set(self.spec)
+        suffixes = {s for _, _, pair in self.joins for s in pair}
+        keep = [col for col in frame.columns
+                if col in keys or col in names or any(col + s in names for s in suffixes)]
+        return frame[keep]
+
+    def reorderable(self, frames, pairs):
+        """Joins may only be reordered when every column found in more than one
+        table is the key of the joins between them, so no suffixes are added
+        and the output names do not depend on the order."""
+        for col in set().union(*[frame.columns for frame in frames]):
+            holders = {i for i, frame in enumerate(frames) if col in frame.columns}
+            linked = set().union(*[set(pair) for (_, on, _), pair in zip(self.joins, pairs) if on == col])
+            if len(holders) > 1 and not holders <= linked:
+                return False
+        return True
+
+    def estimate(self, current, right, on):
+        # Rows per key in right times the share of sampled keys that find a match
+        fanout = len(right) / max(right[on].nunique(), 1)
+        sample = current[on].sample(min(len(current), 10000), random_state=0)
+        return len(current) * fanout * sample.isin(right[on]).mean()
+
+    def execute(self):
+        """Run the plan and return the joined (and aggregated) DataFrame."""
+        pairs = self.key_tables()
+        frames = [self.prune(frame, i, pairs)
+                  for i, frame in enumerate([self.base] + [right for right, _, _ in self.joins])]
+        pending = list(range(len(self.joins)))
+        reorder = self.reorderable(frames, pairs)
+        current = frames[0]
+        joined = {0}
+
+        while pending:
+            if reorder:
+                # Greedily run the join whose key table is joined and whose output is smallest
+                ready = [i for i in pending if pairs[i][0] in joined]
+                best = min(ready, key=lambda i: self.estimate(current, frames[i + 1], self.joins[i][1]))
+            else:
+                # Overlapping columns get suffixes, so keep the eager order and its names
+                best = pending[0]
+            pending.remove(best)
+            _, on, suffixes = self.joins[best]
+            current = current.merge(frames[best + 1], on=on, suffixes=suffixes)
+            joined.add(best + 1)
+
+        if self.spec is None:
+            return current
+        return current.groupby(self.by).agg(self.spec)
+
+# Plan the licenses, zip_demo and wards joins with the median income by alderman
+income_by_alderman = JoinPlan(licenses) \
+                        .merge(zip_demo, on='zip') \
+                        .merge(wards, on='ward') \
+                        .agg('alderman', {'income':'median'}) \
+                        .execute()
+print(income_by_alderman)
+
+# Plan the land_use, census and licenses joins without an aggregation
+land_cen_lic = JoinPlan(land_use) \
+                  .merge(census, on='ward') \
+                  .merge(licenses, on='ward', suffixes=('_cen','_lic')) \
+                  .execute()
+
+# Define a function that finds the row of times nearest to each clock tick
+def asof_positions(times, clock, direction='nearest'):
+    # Last row at or before each tick, and first row at or after it
+    back = np.searchsorted(times, clock, side='right') - 1
+    fwd = np.searchsorted(times, clock, side='left')
+    has_back = back >= 0
+    has_fwd = fwd < len(times)
+    if direction == 'backward':
+        return np.where(has_back, back, -1)
+    if direction == 'forward':
+        return np.where(has_fwd, fwd, -1)
+
+    # On a tie take the earlier row, like merge_asof(direction='nearest')
+    back_gap = clock - times[np.clip(back, 0, None)]
+    fwd_gap = times[np.clip(fwd, None, len(times) - 1)] - clock
+    use_back = has_back & (~has_fwd | (back_gap <= fwd_gap))
+    return np.where(use_back, back, np.where(has_fwd, fwd, -1))
+
+# Define a function that aligns any number of sorted series to a reference clock
+def align_asof(clock, series, on='date_time', columns=('close',), direction='nearest', diffs=False):
+    """Align every DataFrame in the dict series (sorted by on) to the
+    sorted clock, like chained merge_asof calls, without copying the
+    accumulated frame. Columns are named <column>_<name>; with diffs=True
+    the aligned columns are replaced by their row-to-row differences."""
+
+    clock = np.asarray(clock)
+    aligned = {on: clock}
+    for name, frame in series.items():
+        times = frame[on].to_numpy()
+
+        # A series on the clock itself keeps its own rows, duplicates included
+        if len(times) == len(clock) and np.array_equal(times, clock):
+            positions = np.arange(len(clock))
+        else:
+            positions = asof_positions(times, clock, direction)
+        missing = positions < 0
+        for col in columns:
+            values = frame[col].to_numpy(dtype='float64')[positions]
+            values[missing] = np.nan
+            if diffs:
+                values = np.concatenate(([np.nan], np.diff(values)))
+            aligned['{}_{}'.format(col, name)] = values
+    return pd.DataFrame(aligned)
+
+# Align jpm, wells and bac to the jpm clock and compute the price diffs in one call
+price_diffs = align_asof(jpm['date_time'], {'jpm': jpm, 'wells': wells, 'bac': bac}, diffs=True)
+
+# Plot the price diff of the close of jpm, wells and bac only
+price_diffs.plot(y=['close_jpm','close_wells','close_bac'])
+plt.show()
+
+# Define a function that marks the rows whose keys sort at or before bound
+def keys_upto(frame, keys, bound):
+    before = np.zeros(len(frame), dtype=bool)
+    equal = np.ones(len(frame), dtype=bool)
+    for key, value in zip(keys, bound):
+        before |= equal & (frame[key] < value).to_numpy()
+        equal &= (frame[key] == value).to_numpy()
+    return before | equal
+
+# Define a function that forward fills within each group, starting from the carried row
+def ffill_with_carry(merged, groups, carry):
+    if carry is not None:
+        merged = pd.concat([carry, merged], ignore_index=True)
+    values = [col for col in merged.columns if col not in groups]
+    if groups:
+        merged[values] = merged.groupby(groups)[values].ffill()
+    else:
+        merged[values] = merged[values].ffill()
+    new_carry = merged.iloc[[-1]]
+    if carry is not None:
+        merged = merged.iloc[1:]
+    return merged, new_carry
+
+# Define a streaming version of merge_ordered for sources sorted by on
+def stream_merge_ordered(left_path, right_path, out_path, on=('country', 'date'),
+                         how='outer', fill_method=None, chunksize=100000):
+    """Merge two CSV files sorted by the keys in on, like pd.merge_ordered,
+    holding only a chunk of each at a time and appending the merged rows to
+    out_path. With fill_method='ffill' values are forward filled within each
+    group of the leading keys (e.g. per country), carried across chunks.
+    Return the number of rows written."""
+
+    keys = [on] if isinstance(on, str) else list(on)
+    groups = keys[:-1]
+    readers = [pd.read_csv(path, chunksize=chunksize, parse_dates=[keys[-1]])
+               for path in (left_path, right_path)]
+    buffers = [None, None]
+    done = [False, False]
+    carry = None
+    written = 0
+
+    while True:
+        # Refill each buffer that has been used up
+        for i in (0, 1):
+            while not done[i] and (buffers[i] is None or buffers[i].empty):
+                chunk = next(readers[i], None)
+                if chunk is None:
+                    done[i] = True
+                else:
+                    buffers[i] = chunk
+        if all(buffer is None or buffer.empty for buffer in buffers):
+            break
+
+        # Every row up to the smallest last key of an unfinished source is complete
+        bounds = [tuple(buffers[i][keys].iloc[-1]) for i in (0, 1) if not done[i]]
+        ready = []
+        for i in (0, 1):
+            if buffers[i] is None:
+                ready.append(None)
+                continue
+            mask = keys_upto(buffers[i], keys, min(bounds)) if bounds else np.ones(len(buffers[i]), dtype=bool)
+            ready.append(buffers[i][mask])
+            buffers[i] = buffers[i][~mask]
+
+        # Merge the complete rows, fill them from the carried state and append them
+        empty = [frame for frame in ready if frame is not None][0].iloc[:0]
+        merged = pd.merge_ordered(*[empty if frame is None else frame for frame in ready], on=keys, how=how)
+        if merged.empty:
+            continue
+        if fill_method == 'ffill':
+            merged, carry = ffill_with_carry(merged, groups, carry)
+        merged.to_csv(out_path, mode='w' if written == 0 else 'a', header=written == 0, index=False)
+        written += len(merged)
+    return written
+
+# Merge gdp and pop on country and date with fill, a chunk at a time
+print(stream_merge_ordered('gdp.csv', 'pop.csv', 'gdp_pop.csv', on=('country', 'date'), fill_method='ffill'))
+
+# Merge inflation and unemployment on date with an inner join, a chunk at a time
+print(stream_merge_ordered('inflation.csv', 'unemployment.csv', 'inflation_unemploy.csv', on='date', how='inner'))
+
+# Define a table kept as separate keyed partitions instead of one concatenated frame
+class PartitionedTable:
+    """Hold DataFrames as keyed partitions without copying them.
+    Appending adds a partition and aggregations run per partition."""
+
+    def __init__(self, frames=(), keys=None):
+        self.partitions = {}
+        for key, frame in zip(keys if keys is not None else range(len(frames)), frames):
+            self.append(frame, key)
+
+    def append(self, frame, key=None):
+        # Store a reference to frame, the earlier partitions are not touched
+        key = len(self.partitions) if key is None else key
+        if key in self.partitions:
+            raise KeyError('partition {!r} already exists'.format(key))
+        self.partitions[key] = frame
+        return self
+
+    def __len__(self):
+        return sum(len(frame) for frame in self.partitions.values())
+
+    def agg_by_key(self, spec):
+        """Aggregate each partition on its own, like
+        pd.concat(frames, keys=keys).groupby(level=0).agg(spec)."""
+        return pd.DataFrame({key: {col: frame[col].agg(func) for col, func in spec.items()}
+                             for key, frame in self.partitions.items()}).T
+
+    def groupby_agg(self, by, spec):
+        """Group all partitions by the columns by, combining the per-partition
+        sums and counts so only the small partial results are concatenated."""
+        by = [by] if isinstance(by, str) else list(by)
+        partials = []
+        for frame in self.partitions.values():
+            grouped = frame.groupby(by)
+            partial = {}
+            for col, func in spec.items():
+                if func in ('sum', 'mean'):
+                    partial[(col, 'sum')] = grouped[col].sum()
+                if func in ('count', 'mean'):
+                    partial[(col, 'count')] = grouped[col].count()
+                if func not in ('sum', 'count', 'mean'):
+                    raise ValueError('only sum, count and mean combine across partitions, not {!r}'.format(func))
+            partials.append(pd.DataFrame(partial))
+        totals = pd.concat(partials).groupby(level=by).sum()
+        result = pd.DataFrame({col: totals[(col, 'sum')] / totals[(col, 'count')] if func == 'mean'
+                               else totals[(col, func)] for col, func in spec.items()})
+        return result
+
+    def to_frame(self, **kwargs):
+        # Materialize the partitions as one frame only when it is really needed
+        return pd.concat(list(self.partitions.values()), keys=list(self.partitions), **kwargs)
+
+# Add each month as a new partition without copying the earlier months
+invoices = PartitionedTable()
+for key, inv in zip(('7Jul','8Aug','9Sep'), [inv_jul, inv_aug, inv_sep]):
+    invoices.append(inv, key)
+
+# Find the avg of the total column for each month, one partition at a time
+avg_inv_by_month = invoices.agg_by_key({'total':'mean'})
+print(avg_inv_by_month)
+
+# Combine the metallica tracks as partitions instead of appending them
+metallica_tracks = PartitionedTable([tracks_ride, tracks_master, tracks_st])
+print(metallica_tracks.groupby_agg('gid', {'milliseconds':'mean', 'tid':'count'}))
+
+# Define a function that keeps the rows of left with a key in right
+def semi_join(left, right, on, cache=join_cache):
+    """Rows of left whose on key appears in right, without building
+    the joined frame. Uses the cached JoinIndex of right."""
+    codes = cache.index(right, on).keys.get_indexer(left[on])
+    return left[codes >= 0]
+
+# Define a function that keeps the rows of left with no key in right
+def anti_join(left, right, on, cache=join_cache):
+    codes = cache.index(right, on).keys.get_indexer(left[on])
+    return left[codes < 0]
+
+# Define a function that counts the _merge values of a join without running it
+def join_diagnostics(left, right, on, how='left', cache=join_cache):
+    """Return the counts of left.merge(right, on=on, how=how, indicator=True)['_merge']
+    computed from the key multiplicities alone."""
+    index = cache.index(right, on)
+    codes = index.keys.get_indexer(left[on])
+    matches = np.where(codes >= 0, index.counts[codes], 0)
+
+    counts = {'left_only': int((matches == 0).sum()) if how in ('left', 'outer') else 0,
+              'right_only': 0,
+              'both': int(matches.sum())}
+
+    # Rows of right whose key never appears in left
+    if how in ('right', 'outer'):
+        counts['right_only'] = int(len(anti_join(right, left, on, cache)))
+    return pd.Series(counts, name='count')
+
+# Use a semi-join to subset non_mus_tcks to rows with tid in top_invoices
+top_tracks = semi_join(non_mus_tcks, top_invoices, on='tid')
+
+# Group the top_tracks by gid and count the tid rows
+cnt_by_gid = top_tracks.groupby(['gid'], as_index=False).agg({'tid':'count'})
+print(cnt_by_gid)
+
+# Count the matched and unmatched employees without merging top_cust
+print(join_diagnostics(employees, top_cust, on='srid', how='left'))
+
+# Month numbers for the month column labels of a wide year x month table
+month_numbers = {name: i + 1 for i, name in enumerate(['jan', 'feb', 'mar', 'apr', 'may', 'jun',
+                                                       'jul', 'aug', 'sep', 'oct', 'nov', 'dec'])}
+
+# Define a function that turns a month column label into its number
+def month_number(label):
+    label = str(label).strip().lower()
+    return int(label) if label.isdigit() else month_numbers[label[:3]]
+
+# Define a function that unpivots a year x month table into a dated, sorted long table
+def melt_year_month(wide, year='year', var_name='month', value_name='value'):
+    """Unpivot wide (one row per year, one column per month) into one row
+    per year and month with a date column built from the integer codes.
+    Rows come out sorted by date without a sort when the years ascend and
+    the month columns are in calendar order."""
+
+    months = [col for col in wide.columns if col != year]
+    numbers = np.array([month_number(col) for col in months])
+    years = wide[year].astype(int).to_numpy()
+
+    # Ravel year by year so each year's months stay together
+    long = pd.DataFrame({year: np.repeat(years, len(months)),
+                         var_name: np.tile(months, len(years)),
+                         value_name: wide[months].to_numpy().ravel()})
+
+    # Months since 1970 give the first day of each month directly
+    codes = (long[year].to_numpy() - 1970) * 12 + np.tile(numbers - 1, len(years))
+    long['date'] = codes.astype('datetime64[M]').astype('datetime64[ns]')
+
+    if not (np.all(np.diff(years) > 0) and np.all(np.diff(numbers) > 0)):
+        long = long.iloc[np.argsort(codes, kind='stable')].reset_index(drop=True)
+    return long
+
+# Define a function that filters on the id column before melting
+def melt_where(frame, id_var, keep, var_name='variable', value_name='value'):
+    # Only the kept rows are unpivoted, instead of filtering the long table
+    return frame[frame[id_var] == keep].melt(id_vars=id_var, var_name=var_name, value_name=value_name)
+
+# Unpivot ur_wide into a long table already sorted by date
+ur_sorted = melt_year_month(ur_wide, year='year', var_name='month', value_name='unempl_rate')
+
+# Plot the unempl_rate by date
+ur_sorted.plot(x='date',y='unempl_rate')
+plt.show()
+
+# Select the close rows of ten_yr before unpivoting them
+bond_perc_close = melt_where(ten_yr, 'metric', 'close', var_name='date', value_name='close')
@@ -110,4 +110,321 @@ searched = ri[ri.search_conducted == True]
 print(searched.frisk.mean())
 
 # Calculate the frisk rate for each gender
-print(searched.groupby('driver_gender')['frisk'].mean())
\ No newline at end of file
+print(searched.groupby('driver_gender')['frisk'].mean())
+
+# Import union_categoricals
+from pandas.api.types import union_categoricals
+
+# Columns dropped and dtypes cast while reading police.csv
+police_drop_cols = ['county_name', 'state']
+police_dtypes = {'is_arrested': 'boolean'}
+
+# Define a function that cleans one chunk of stops
+def clean_police_chunk(chunk):
+    # Drop all rows that are missing 'driver_gender', after which
+    # nothing is missing from 'is_arrested' and it can be a plain bool
+    return chunk.dropna(subset=['driver_gender']).astype({'is_arrested': 'bool'})
+
+# Define a generator that streams cleaned chunks of police.csv
+def iter_police(path='police.csv', chunksize=100000, dtypes=police_dtypes, **read_options):
+    """Generator function that reads path (a file name or an open file) in
+    chunks of chunksize rows and yields each chunk already cleaned. Any
+    read_options are passed on to pd.read_csv."""
+
+    # Skip the dropped columns and parse dtypes in the read itself
+    reader = pd.read_csv(path,
+                         usecols=lambda col: col not in police_drop_cols,
+                         dtype=dtypes,
+                         chunksize=chunksize,
+                         **read_options)
+    for chunk in reader:
+        yield clean_police_chunk(chunk)
+
+# Define a function that concatenates chunks, keeping categorical columns
+# categorical even when the chunks saw different categories
+def concat_chunks(chunks):
+    for col in chunks[0].select_dtypes('category').columns:
+        categories = union_categoricals([chunk[col] for chunk in chunks]).categories
+        for chunk in chunks:
+            chunk[col] = chunk[col].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+# Define a loader that returns the cleaned stops as one DataFrame
+def read_police(path='police.csv', chunksize=None, dtypes=police_dtypes):
+    # Read the whole file at once when no chunksize is given
+    if chunksize is None:
+        return clean_police_chunk(pd.read_csv(path,
+                                              usecols=lambda col: col not in police_drop_cols,
+                                              dtype=dtypes))
+
+    # Otherwise only the cleaned chunks are kept in memory
+    return concat_chunks(list(iter_police(path, chunksize, dtypes)))
+
+# Read 'police.csv' in chunks into a cleaned DataFrame named ri
+ri = read_police('police.csv', chunksize=100000)
+print(ri.dtypes)
+
+# Count the violations over the whole file one chunk at a time
+violation_counts = None
+for chunk in iter_police('police.csv'):
+    counts = chunk.violation.value_counts()
+    violation_counts = counts if violation_counts is None else violation_counts.add(counts, fill_value=0)
+print(violation_counts)
+
+# Import numpy as np
+import numpy as np
+
+# Define a function that parses a string column once per distinct value
+def parse_distinct_ns(column, fmt):
+    # Factorize so each repeated string is parsed only once
+    codes, uniques = pd.factorize(column)
+
+    # An all-missing column has nothing to parse, so every row is NaT
+    if len(uniques) == 0:
+        return np.zeros(len(codes), dtype='int64'), np.ones(len(codes), dtype=bool)
+
+    parsed = pd.to_datetime(uniques, format=fmt)
+    ns = np.asarray(parsed, dtype='datetime64[ns]').view('int64')
+    return ns[codes], codes < 0
+
+# Define a function that builds the stop timestamps without concatenating strings
+def build_stop_datetime(stop_date, stop_time, date_format='%Y-%m-%d', time_format='%H:%M'):
+    """Parse the date and time columns separately with fixed
+    formats and add them together as integer nanoseconds."""
+
+    date_ns, date_missing = parse_distinct_ns(stop_date, date_format)
+    time_ns, time_missing = parse_distinct_ns(stop_time, time_format)
+
+    # A time parsed on its own falls on 1900-01-01, so keep only its offset
+    time_ns = time_ns - pd.Timestamp('1900-01-01').value
+
+    # Add the offsets and mark stops missing either part as NaT
+    stamps = date_ns + time_ns
+    stamps[date_missing | time_missing] = np.iinfo('int64').min
+    return pd.DatetimeIndex(stamps.view('datetime64[ns]'), name='stop_datetime')
+
+# Build 'stop_datetime' from 'stop_date' and 'stop_time' and set it as the index
+ri['stop_datetime'] = build_stop_datetime(ri.stop_date, ri.stop_time)
+ri.set_index('stop_datetime', inplace=True)
+print(ri.index)
+
+# Compact dtypes for the columns the analysis groups on and averages
+police_schema = {
+    'driver_gender': 'category',
+    'driver_race': 'category',
+    'violation_raw': 'category',
+    'violation': 'category',
+    'search_type': 'category',
+    'stop_outcome': 'category',
+    'stop_duration': 'category',
+    'district': 'category',
+    'search_conducted': 'boolean',
+    'is_arrested': 'boolean',
+    'drugs_related_stop': 'boolean',
+}
+
+# Define a function that casts a stops DataFrame to the compact schema
+def apply_police_schema(df, schema=police_schema):
+    # Columns already cleaned to a plain bool are smaller than a nullable one
+    df = df.astype({col: dtype for col, dtype in schema.items()
+                    if col in df.columns and df[col].dtype != bool})
+
+    # Downcast the remaining integer columns to the smallest int that fits
+    for col in df.select_dtypes('integer').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+# Define a function that reports the memory saved in each column
+def schema_memory_report(before, after):
+    report = pd.DataFrame({'before': before.memory_usage(deep=True, index=False),
+                           'after': after.memory_usage(deep=True, index=False)})
+    report['saved'] = report['before'] - report['after']
+    return report.sort_values('saved', ascending=False)
+
+# Cast ri to the compact schema and print the memory saved per column
+ri_compact = apply_police_schema(ri)
+print(schema_memory_report(ri, ri_compact))
+
+# Or read police.csv with the compact schema applied in the read itself
+ri_compact = read_police('police.csv', chunksize=100000, dtypes=police_schema)
+
+# Calculate the search rate on the nullable boolean column
+print(ri_compact.search_conducted.mean())
+
+# Group on the category codes instead of Python strings
+print(ri_compact.groupby(['driver_gender', 'violation'], observed=True).search_conducted.mean())
+
+# Calculate the frisk rate for each gender among searched stops
+searched = ri_compact[ri_compact.search_conducted == True]
+frisk = searched.search_type.str.contains('Protective Frisk', na=False)
+print(frisk.groupby(searched.driver_gender, observed=True).mean())
+
+# Dimensions of the rate cube
+cube_dims = ['driver_gender', 'violation', 'stop_outcome', 'search_conducted', 'frisk']
+
+# Define a function that counts stops and arrests for every combination of the dimensions
+def build_rate_cube(df):
+    """Make one pass over df and return the number of stops and
+    arrests for every combination of the cube dimensions."""
+
+    # Derive 'frisk' from 'search_type' when it is not already a column
+    if 'frisk' not in df.columns:
+        df = df.assign(frisk=df.search_type.str.contains('Protective Frisk', na=False))
+
+    keys = [df[dim].astype(bool) if dim in ('search_conducted', 'frisk') else df[dim] for dim in cube_dims]
+    return df.groupby(keys, observed=True, dropna=False).agg(stops=('is_arrested', 'size'),
+                                                                arrests=('is_arrested', 'sum'))
+
+# Define a function that adds the stops of a new day to an existing cube
+def update_rate_cube(cube, new_stops):
+    return cube.add(build_rate_cube(new_stops), fill_value=0)
+
+# Define a function that keeps the cube cells matching where
+def cube_slice(cube, where=None):
+    for dim, value in (where or {}).items():
+        cube = cube[cube.index.get_level_values(dim) == value]
+    return cube
+
+# Define a function that reads the proportions of each value of dim from the cube
+def cube_proportions(cube, dim, where=None):
+    counts = cube_slice(cube, where).groupby(level=dim, observed=True)['stops'].sum()
+    counts = counts[counts > 0]
+    return (counts / counts.sum()).sort_values(ascending=False)
+
+# Define a function that reads the rate of a flag (a dimension or 'arrests') from the cube
+def cube_rate(cube, flag, by=None, where=None):
+    cube = cube_slice(cube, where)
+    if flag in cube_dims:
+        hits = cube['stops'].where(cube.index.get_level_values(flag), 0)
+    else:
+        hits = cube[flag]
+    if not by:
+        return hits.sum() / cube['stops'].sum()
+    return hits.groupby(level=by, observed=True).sum() / cube['stops'].groupby(level=by, observed=True).sum()
+
+# Build the rate cube in one pass over ri
+rate_cube = build_rate_cube(ri)
+
+# Compute the stop outcomes for female and male drivers stopped for speeding
+print(cube_proportions(rate_cube, 'stop_outcome', where={'driver_gender': 'F', 'violation': 'Speeding'}))
+print(cube_proportions(rate_cube, 'stop_outcome', where={'driver_gender': 'M', 'violation': 'Speeding'}))
+
+# Calculate the search rate overall and for each combination of gender and violation
+print(cube_rate(rate_cube, 'search_conducted'))
+print(cube_rate(rate_cube, 'search_conducted', by=['driver_gender', 'violation']))
+
+# Calculate the frisk rate for each gender among searched stops
+print(cube_rate(rate_cube, 'frisk', by='driver_gender', where={'search_conducted': True}))
+
+# Calculate the arrest rate for each violation
+print(cube_rate(rate_cube, 'arrests', by='violation'))
+
+# Import the modules used to keep the store on disk
+import csv
+import glob
+import json
+import os
+
+# Define a function that reads the state of the store, or a fresh state
+def load_store_state(store):
+    path = os.path.join(store, 'state.json')
+    if not os.path.exists(path):
+        return {'last_stop_datetime': None, 'rows_at_last': 0, 'parts': 0,
+                'path': None, 'offset': 0, 'columns': None}
+    with open(path) as f:
+        return json.load(f)
+
+# Define a function that reads the rate cube kept in the store
+def load_store_cube(store):
+    path = os.path.join(store, 'rate_cube.parquet')
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path).set_index(cube_dims)
+
+# Define a function that reads all the cleaned stops kept in the store
+def read_police_store(store='police_store'):
+    parts = sorted(glob.glob(os.path.join(store, 'stops', '*.parquet')))
+    return concat_chunks([pd.read_parquet(part) for part in parts])
+
+# Define a function that drops the stops at or before the (timestamp, row) watermark
+def after_watermark(chunk, last, skip):
+    """Keep the stops later than last, and all but the first skip stops at
+    last itself. Return the kept stops and how many stops at last remain
+    to be skipped in later chunks."""
+    at_last = np.flatnonzero((chunk.stop_datetime == last).to_numpy())
+    keep = (chunk.stop_datetime > last).to_numpy().copy()
+    keep[at_last[skip:]] = True
+    return chunk[keep], max(skip - len(at_last), 0)
+
+# Define a function that appends only the new stops of path to the store
+def refresh_police_store(path, store='police_store', chunksize=100000):
+    """Clean the new stops in path, append them to the store as parquet
+    parts and add them to the stored rate cube. Return the number of new stops.
+
+    When path is the file of the last refresh, reading starts at the byte
+    offset where that refresh stopped, so only the rows appended since then
+    are read. Any other file (e.g. one day's delta) is read from the start,
+    and stops up to the (stop_datetime, row) watermark of the last refresh
+    are skipped, so re-running a file does not count its stops twice. The
+    file must not be appended to while a refresh reads it."""
+
+    os.makedirs(os.path.join(store, 'stops'), exist_ok=True)
+    state = load_store_state(store)
+    cube = load_store_cube(store)
+    last = state['last_stop_datetime'] and pd.Timestamp(state['last_stop_datetime'])
+    rows_at_last = state.get('rows_at_last', 0)
+    same_file = state.get('path') == os.path.abspath(path)
+
+    new_rows = 0
+    with open(path, 'rb') as f:
+        if same_file:
+            if os.path.getsize(path) < state['offset']:
+                raise ValueError('{} is shorter than when it was last read; was it replaced?'.format(path))
+            f.seek(state['offset'])
+            columns = state['columns']
+        else:
+            columns = next(csv.reader([f.readline().decode()]))
+        skip = 0 if same_file else rows_at_last
+        newest = last
+
+        for chunk in iter_police(f, chunksize, dtypes=police_schema, header=None, names=columns):
+            # Build 'stop_datetime' and skip the stops already processed
+            chunk['stop_datetime'] = build_stop_datetime(chunk.stop_date, chunk.stop_time)
+            if last and not same_file:
+                chunk, skip = after_watermark(chunk, last, skip)
+            if chunk.empty:
+                continue
+
+            # Write the new stops as their own part, indexed by 'stop_datetime'
+            part = os.path.join(store, 'stops', 'part-{:06d}.parquet'.format(state['parts']))
+            chunk.set_index('stop_datetime').to_parquet(part)
+            state['parts'] += 1
+
+            # Add the new stops to the running counts
+            cube = build_rate_cube(chunk) if cube is None else update_rate_cube(cube, chunk)
+            new_rows += len(chunk)
+
+            # Move the watermark to the latest stop and count the stops at it
+            chunk_newest = chunk.stop_datetime.max()
+            if not newest or chunk_newest > newest:
+                newest, rows_at_last = chunk_newest, 0
+            if chunk_newest == newest:
+                rows_at_last += int((chunk.stop_datetime == newest).sum())
+
+        # Everything up to the end of the file has now been read
+        state.update(path=os.path.abspath(path), offset=f.tell(), columns=columns)
+
+    # Save the cube and state only after every part has been written
+    if new_rows:
+        cube.reset_index().to_parquet(os.path.join(store, 'rate_cube.parquet'))
+        state['last_stop_datetime'] = newest.isoformat()
+        state['rows_at_last'] = rows_at_last
+    with open(os.path.join(store, 'state.json'), 'w') as f:
+        json.dump(state, f)
+    return new_rows
+
+# Process tonight's stops and read the running counts from the stored cube
+print(refresh_police_store('police.csv'))
+rate_cube = load_store_cube('police_store')
+print(cube_proportions(rate_cube, 'violation'))
+print(cube_rate(rate_cube, 'search_conducted', by=['driver_gender', 'violation']))
@@ -589,27 +589,72 @@ census = Table('census', metadata,
 # Create the table in the database
 metadata.create_all(engine)
 
-# Create an empty list: values_list
-values_list = []
-
-# Iterate over the rows
-for row in csv_reader:
-    # Create a dictionary with the values
-    data = {'state': row[0], 'sex': row[1], 'age':row[2], 'pop2000': row[3],
-            'pop2008': row[4]}
-    # Append the dictionary to the values list
-    values_list.append(data)
-# Import insert
+# Import time and insert
+import time
 from sqlalchemy import insert
 
-# Build insert statement: stmt
-stmt = insert(census)
-
-# Use values_list to insert data: results
-results = connection.execute(stmt, values_list)
-
-# Print rowcount
-print(results.rowcount)
+# Import csv and islice
+import csv
+from itertools import islice
+
+# Pragmas that trade crash safety for speed while a bulk load runs
+bulk_load_pragmas = {'synchronous': 'OFF', 'journal_mode': 'MEMORY',
+                     'temp_store': 'MEMORY', 'cache_size': '-65536'}
+
+# Define a generator that yields the rows of a CSV file as tuple batches
+def csv_batches(path, batch_size, header):
+    with open(path, newline='') as csvfile:
+        csv_reader = csv.reader(csvfile)
+        if header:
+            next(csv_reader)
+        while True:
+            batch = list(map(tuple, islice(csv_reader, batch_size)))
+            if not batch:
+                break
+            yield batch
+
+# Define a function that bulk loads a CSV file into a table
+def bulk_load_csv(engine, table, path, batch_size=10000, header=False):
+    """Insert the rows of the CSV file at path into table in batches of
+    batch_size tuples through executemany, in a single transaction, and
+    return the number of rows and the rows per second. The raw cursor skips
+    SQLAlchemy's execute events, so cached results of table go stale unless
+    the caller invalidates them. The tuples and pragmas need SQLite, so
+    other backends raise ValueError."""
+
+    if engine.dialect.name != 'sqlite':
+        raise ValueError("bulk_load_csv needs SQLite, not {!r}".format(engine.dialect.name))
+    stmt = str(insert(table).compile(dialect=engine.dialect))
+    raw_connection = engine.raw_connection()
+    cursor = raw_connection.cursor()
+
+    # Tune SQLite for the load and remember the settings to restore
+    saved = {}
+    for name, value in bulk_load_pragmas.items():
+        saved[name] = cursor.execute('PRAGMA {}'.format(name)).fetchone()[0]
+        cursor.execute('PRAGMA {} = {}'.format(name, value))
+
+    start = time.perf_counter()
+    rows = 0
+    try:
+        for batch in csv_batches(path, batch_size, header):
+            cursor.executemany(stmt, batch)
+            rows += len(batch)
+        raw_connection.commit()
+    except Exception:
+        raw_connection.rollback()
+        raise
+    finally:
+        for name, value in saved.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+        cursor.close()
+        raw_connection.close()
+    seconds = time.perf_counter() - start
+    return rows, rows / seconds if seconds else float('inf')
+
+# Bulk load census.csv into the census table and print the rows per second
+rows, rows_per_sec = bulk_load_csv(engine, census, 'census.csv')
+print('{} rows at {:.0f} rows/sec'.format(rows, rows_per_sec))
 
 
 # Import select and func
@@ -662,4 +707,724 @@ results = connection.execute(stmt).fetchall()
 
 # Print the state and population change for each record
 for result in results:
-    print('{}:{}'.format(result.state, result.pop_change))
\ No newline at end of file
+    print('{}:{}'.format(result.state, result.pop_change))
+
+# Import Counter and itemgetter
+from collections import Counter
+from operator import itemgetter
+
+# Define a function that counts a cursor's rows per value in large batches
+def count_results(results_proxy, column='state', batch_size=10000):
+    """Consume results_proxy (a ResultProxy or a DBAPI cursor) in batches
+    of batch_size rows and return a dict with the number of rows for each
+    value of column, given by name or by position."""
+
+    # Look the column up once and read it by position from every row
+    if not isinstance(column, int):
+        column = results_proxy.keys().index(column)
+    get_column = itemgetter(column)
+    counts = Counter()
+    while True:
+        partial_results = results_proxy.fetchmany(batch_size)
+        if not partial_results:
+            break
+
+        # Counter counts a whole batch in C instead of one dict update per row
+        counts.update(map(get_column, partial_results))
+    results_proxy.close()
+    return dict(counts)
+
+# Define a function that counts the rows of a table per value of column
+def count_by(connection, table, column='state', push_down=True, batch_size=10000):
+    # Let the database do the GROUP BY ... COUNT(*) when it can
+    if push_down:
+        stmt = select([table.columns[column], func.count()]).group_by(table.columns[column])
+        return dict(connection.execute(stmt).fetchall())
+
+    # Otherwise stream the column through the DBAPI cursor, whose plain
+    # tuples are cheaper to build than ResultProxy rows, and count it in batches
+    compiled = select([table.columns[column]]).compile(connection)
+    cursor = connection.connection.cursor()
+    cursor.execute(str(compiled))
+    return count_results(cursor, 0, batch_size)
+
+# Define a function that times the 50-row loop against both modes of count_by
+def benchmark_count_by(connection, table, column='state', batch_size=10000):
+    timings = {}
+
+    start = time.perf_counter()
+    results_proxy = connection.execute(select([table.columns[column]]))
+    state_count = {}
+    more_results = True
+    while more_results:
+        partial_results = results_proxy.fetchmany(50)
+        if partial_results == []:
+            more_results = False
+        for row in partial_results:
+            if row[column] in state_count:
+                state_count[row[column]] += 1
+            else:
+                state_count[row[column]] = 1
+    results_proxy.close()
+    timings['fetchmany(50) loop'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    streamed = count_by(connection, table, column, push_down=False, batch_size=batch_size)
+    timings['batched Counter'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pushed = count_by(connection, table, column)
+    timings['GROUP BY push-down'] = time.perf_counter() - start
+
+    # All three ways must agree before their timings mean anything
+    assert state_count == streamed == pushed
+    return timings
+
+# Count the census rows by state on the database
+state_count = count_by(connection, census, 'state')
+print(state_count)
+
+# Compare the 50-row loop with both modes on the local census
+print(benchmark_count_by(connection, census, 'state'))
+
+# Import bindparam
+from sqlalchemy import bindparam
+
+# Define a query layer that builds each statement shape once and reuses its compiled form
+class CensusQueries:
+    """Parameterized census queries. Each statement is built once per shape
+    with bound parameters, and the connection keeps its compiled form in
+    compiled_cache, so re-running a query skips building and compiling."""
+
+    def __init__(self, connection, census, state_fact=None):
+        self.connection = connection.execution_options(compiled_cache={})
+        self.census = census
+        self.state_fact = state_fact
+        self.statements = {}
+
+    def statement(self, shape, build):
+        # Build the statement the first time this shape is asked for
+        if shape not in self.statements:
+            self.statements[shape] = build()
+        return self.statements[shape]
+
+    def execute(self, shape, build, **params):
+        return self.connection.execute(self.statement(shape, build), **params)
+
+    def in_states(self, states):
+        # An expanding parameter takes a list of any length in one statement
+        return self.execute('in_states', lambda: select([self.census]).where(
+            self.census.columns.state.in_(bindparam('states', expanding=True))), states=list(states)).fetchall()
+
+    def state_not_sex(self, state, sex):
+        return self.execute('state_not_sex', lambda: select([self.census]).where(
+            and_(self.census.columns.state == bindparam('state'),
+                 self.census.columns.sex != bindparam('sex'))), state=state, sex=sex).fetchall()
+
+    def states_ordered(self, descending=False):
+        column = self.census.columns.state
+        return self.execute(('states_ordered', descending), lambda: select([column]).order_by(
+            desc(column) if descending else column)).fetchall()
+
+    def pop2008_by_state(self):
+        return self.execute('pop2008_by_state', lambda: select([
+            self.census.columns.state,
+            func.sum(self.census.columns.pop2008).label('population')
+        ]).group_by(self.census.columns.state)).fetchall()
+
+    def pop2000_by_division(self, region):
+        return self.execute('pop2000_by_division', lambda: select([
+            self.state_fact.columns.census_division_name,
+            func.sum(self.census.columns.pop2000).label('population')
+        ]).select_from(
+            self.census.join(self.state_fact, self.census.columns.state == self.state_fact.columns.name)
+        ).where(self.state_fact.columns.census_region_name == bindparam('region')
+        ).group_by(self.state_fact.columns.census_division_name), region=region).fetchall()
+
+# Build the query layer once: census_queries
+census_queries = CensusQueries(connection, census, state_fact)
+
+# Re-run the state filters with new parameters, reusing the compiled statements
+for states in (['New York', 'California', 'Texas'], ['Ohio']):
+    print(len(census_queries.in_states(states)))
+for result in census_queries.state_not_sex('California', 'M'):
+    print(result.age, result.sex)
+print(census_queries.pop2008_by_state())
+
+# Import event, TextClause, UpdateBase and find_tables
+from sqlalchemy import event
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.util import find_tables
+
+# Define a cache of query results that is invalidated per table on every write
+class ResultCache:
+    """Cache the rows of read queries, keyed by their database URL, SQL,
+    parameters and the version of every table they read. Inserts, updates and
+    deletes run through a watched engine and table drops bump the version of
+    the table they touch; any textual SQL other than a SELECT drops every
+    result of its database. Writes that bypass SQLAlchemy's execute, such as
+    bulk_load_csv on a raw DBAPI cursor, must call invalidate themselves."""
+
+    def __init__(self, engine):
+        self.versions = {}
+        self.results = {}
+        self.watched = set()
+        self.watch(engine)
+        event.listen(Table, 'after_drop', self.after_drop)
+
+    def watch(self, engine):
+        # Listen for the writes of each engine once, whichever connection brought it
+        if engine not in self.watched:
+            event.listen(engine, 'after_execute', self.after_execute)
+            self.watched.add(engine)
+
+    def invalidate(self, engine, name=None):
+        """Bump the version of table name in engine's database, or forget all
+        of that database's results when name is None."""
+        url = str(engine.url)
+        if name is not None:
+            self.versions[(url, name)] = self.versions.get((url, name), 0) + 1
+
+        # Forget the results computed from the old version of the table
+        for key in [key for key in self.results if key[0] == url and (name is None or name in dict(key[3]))]:
+            del self.results[key]
+
+    def after_execute(self, conn, clauseelement, multiparams, params, result):
+        # Insert, update and delete statements carry the table they write
+        if isinstance(clauseelement, UpdateBase):
+            self.invalidate(conn.engine, clauseelement.table.name)
+
+        # Textual SQL does not say what it writes, so assume it may write anything
+        elif isinstance(clauseelement, (TextClause, str)):
+            sql = clauseelement.text if isinstance(clauseelement, TextClause) else clauseelement
+            if not sql.lstrip().upper().startswith('SELECT'):
+                self.invalidate(conn.engine)
+
+    def after_drop(self, table, connection, **kw):
+        self.invalidate(connection.engine, table.name)
+
+    def fetchall(self, connection, stmt):
+        """Return stmt's rows, running it only when a table it reads has changed."""
+        self.watch(connection.engine)
+        url = str(connection.engine.url)
+        compiled = stmt.compile(connection)
+        tables = sorted({table.name for table in find_tables(stmt, include_joins=True, include_aliases=True)
+                         if isinstance(table, Table)})
+        key = (url, str(compiled), tuple(sorted(compiled.params.items())),
+               tuple((name, self.versions.get((url, name), 0)) for name in tables))
+        if key not in self.results:
+            self.results[key] = connection.execute(stmt).fetchall()
+        return self.results[key]
+
+    def scalar(self, connection, stmt):
+        rows = self.fetchall(connection, stmt)
+        return rows[0][0] if rows else None
+
+# Put a result cache in front of the census aggregates: result_cache
+result_cache = ResultCache(engine)
+
+# Select the average of age weighted by pop2000, computed once until census changes
+stmt = select([
+    func.sum(census.columns.age * census.columns.pop2000) / func.sum(census.columns.pop2000)
+])
+print(result_cache.scalar(connection, stmt))
+
+# Read the top 10 pop_change states from the cache
+stmt = select([census.columns.state,
+     (census.columns.pop2008-census.columns.pop2000).label('pop_change')
+]).group_by(census.columns.state).order_by(desc('pop_change')).limit(10)
+for result in result_cache.fetchall(connection, stmt):
+    print('{}:{}'.format(result.state, result.pop_change))
+
+# Import DDL and PrimaryKeyConstraint
+from sqlalchemy import DDL, PrimaryKeyConstraint
+
+# Define the per-state, per-sex summary of the census: state_summary
+state_summary = Table('state_summary', metadata,
+                      Column('state', String(30)),
+                      Column('sex', String(1)),
+                      Column('rows', Integer()),
+                      Column('pop2000', Integer()),
+                      Column('pop2008', Integer()),
+                      PrimaryKeyConstraint('state', 'sex'))
+
+# Triggers that apply every census insert, update and delete to state_summary
+state_summary_triggers = [
+    """CREATE TRIGGER IF NOT EXISTS census_summary_insert AFTER INSERT ON census BEGIN
+        INSERT INTO state_summary (state, sex, rows, pop2000, pop2008)
+        VALUES (NEW.state, NEW.sex, 1, COALESCE(NEW.pop2000, 0), COALESCE(NEW.pop2008, 0))
+        ON CONFLICT (state, sex) DO UPDATE SET rows = rows + 1,
+            pop2000 = pop2000 + excluded.pop2000, pop2008 = pop2008 + excluded.pop2008;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS census_summary_delete AFTER DELETE ON census BEGIN
+        UPDATE state_summary SET rows = rows - 1,
+            pop2000 = pop2000 - COALESCE(OLD.pop2000, 0), pop2008 = pop2008 - COALESCE(OLD.pop2008, 0)
+        WHERE state = OLD.state AND sex = OLD.sex;
+        DELETE FROM state_summary WHERE state = OLD.state AND sex = OLD.sex AND rows = 0;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS census_summary_update AFTER UPDATE ON census BEGIN
+        UPDATE state_summary SET rows = rows - 1,
+            pop2000 = pop2000 - COALESCE(OLD.pop2000, 0), pop2008 = pop2008 - COALESCE(OLD.pop2008, 0)
+        WHERE state = OLD.state AND sex = OLD.sex;
+        DELETE FROM state_summary WHERE state = OLD.state AND sex = OLD.sex AND rows = 0;
+        INSERT INTO state_summary (state, sex, rows, pop2000, pop2008)
+        VALUES (NEW.state, NEW.sex, 1, COALESCE(NEW.pop2000, 0), COALESCE(NEW.pop2008, 0))
+        ON CONFLICT (state, sex) DO UPDATE SET rows = rows + 1,
+            pop2000 = pop2000 + excluded.pop2000, pop2008 = pop2008 + excluded.pop2008;
+    END""",
+]
+
+# Define a function that builds state_summary from census and keeps it up to date
+def create_state_summary(connection):
+    """Create state_summary on connection, fill it from a single scan of
+    census and install the triggers that maintain it on every later write.
+    The triggers use SQLite syntax, so other backends raise ValueError."""
+
+    if connection.dialect.name != 'sqlite':
+        raise ValueError("state_summary triggers need SQLite, not {!r}".format(connection.dialect.name))
+    state_summary.create(connection, checkfirst=True)
+    with connection.begin():
+        connection.execute(delete(state_summary))
+        connection.execute(insert(state_summary).from_select(
+            ['state', 'sex', 'rows', 'pop2000', 'pop2008'],
+            select([census.columns.state, census.columns.sex, func.count(),
+                    func.coalesce(func.sum(census.columns.pop2000), 0),
+                    func.coalesce(func.sum(census.columns.pop2008), 0)
+            ]).group_by(census.columns.state, census.columns.sex)))
+        for trigger in state_summary_triggers:
+            connection.execute(DDL(trigger))
+
+# Build the materialized state_summary table on the connection that reads it
+create_state_summary(connection)
+
+# Rank the states by population change, reading ~100 summary rows instead of the census
+stmt = select([state_summary.columns.state,
+               (func.sum(state_summary.columns.pop2008) - func.sum(state_summary.columns.pop2000)).label('pop_change')
+]).group_by(state_summary.columns.state).order_by(desc('pop_change')).limit(10)
+for result in connection.execute(stmt).fetchall():
+    print('{}:{}'.format(result.state, result.pop_change))
+
+# Calculate the percentage of women in 2000 for each state from the summary
+stmt = select([state_summary.columns.state,
+    (func.sum(
+        case([
+            (state_summary.columns.sex == 'F', state_summary.columns.pop2000)
+        ], else_=0)) /
+     cast(func.sum(state_summary.columns.pop2000), Float) * 100).label('percent_female')
+]).group_by(state_summary.columns.state)
+for result in connection.execute(stmt).fetchall():
+    print(result.state, result.percent_female)
+
+# Sum the 2008 population of each state with its census division name
+stmt = select([
+    state_summary.columns.state,
+    func.sum(state_summary.columns.pop2008),
+    state_fact.columns.census_division_name
+]).select_from(
+    state_summary.join(state_fact, state_summary.columns.state == state_fact.columns.name)
+).group_by(state_fact.columns.name)
+for record in connection.execute(stmt).fetchall():
+    print(record)
+
+# Define a function that sets a column from a lookup built once, instead of per row
+def update_from_lookup(connection, target, key, column, lookup_stmt, method=None, batch_size=500):
+    """Set target.column from the (key, value) rows of lookup_stmt, matching on
+    target.key, like update(target).values(column=<correlated subquery>) but
+    with the lookup read once. Rows with no match are set to NULL, as the
+    subquery would. method is 'join' (a temporary table joined in one UPDATE,
+    on PostgreSQL and MySQL) or 'case' (batched CASE updates, everywhere else).
+    Return the number of rows updated."""
+
+    mapping = dict(connection.execute(lookup_stmt).fetchall())
+    if method is None:
+        method = 'join' if connection.dialect.name in ('postgresql', 'mysql') else 'case'
+
+    if method not in ('join', 'case'):
+        raise ValueError("method must be 'join' or 'case', not {!r}".format(method))
+
+    key_col = target.columns[key]
+    with connection.begin():
+        # Clear the column first, so rows whose key is not in the lookup keep NULL, as with the subquery
+        rowcount = connection.execute(update(target).values({column: None})).rowcount
+
+        if method == 'join':
+            # Load the mapping into a temporary table and update through a join
+            lookup = Table('lookup_' + target.name, MetaData(),
+                           Column('key', key_col.type), Column('value', target.columns[column].type),
+                           prefixes=['TEMPORARY'])
+            lookup.create(connection)
+            connection.execute(insert(lookup), [{'key': k, 'value': v} for k, v in mapping.items()])
+            connection.execute(update(target).values({column: lookup.columns.value})
+                               .where(key_col == lookup.columns.key))
+            lookup.drop(connection)
+        else:
+            # Update batch_size keys per statement with a CASE on the key
+            items = list(mapping.items())
+            for start in range(0, len(items), batch_size):
+                batch = dict(items[start:start + batch_size])
+                connection.execute(update(target).values({column: case(batch, value=key_col)})
+                                   .where(key_col.in_(list(batch))))
+    return rowcount
+
+# Set flat_census.state_name from the fips -> name mapping of state_fact
+fips_lookup = select([state_fact.columns.fips_state, state_fact.columns.name])
+results = update_from_lookup(connection, flat_census, 'fips_code', 'state_name', fips_lookup)
+
+# Print rowcount
+print(results)
+
+# Import asyncio, ThreadPoolExecutor and QueuePool
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.pool import QueuePool
+
+# Define a function that turns on WAL mode for every new SQLite connection
+def set_sqlite_wal(dbapi_connection, connection_record):
+    # In WAL mode readers do not block the writer and the writer does not block readers
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+# Define a function that creates an engine with a pool of reusable connections
+def create_pooled_engine(url, pool_size=8):
+    if url.startswith('sqlite'):
+        # Let the pooled SQLite connections be used from the worker threads
+        engine = create_engine(url, poolclass=QueuePool, pool_size=pool_size, max_overflow=0,
+                               connect_args={'check_same_thread': False})
+        event.listen(engine, 'connect', set_sqlite_wal)
+        return engine
+    return create_engine(url, pool_size=pool_size, max_overflow=0)
+
+# Define a function that runs one read on its own pooled connection
+def fetch_pooled(engine, stmt):
+    with engine.connect() as conn:
+        return conn.execute(stmt).fetchall()
+
+# Define a function that runs independent reads at the same time
+def run_concurrently(engine, statements, max_workers=None):
+    """Run the statements in the dict statements on a thread pool, each on its
+    own pooled connection, and return a dict of their rows by name."""
+    with ThreadPoolExecutor(max_workers or engine.pool.size()) as executor:
+        futures = {name: executor.submit(fetch_pooled, engine, stmt) for name, stmt in statements.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+# Define a coroutine that awaits the same reads from asyncio code
+async def run_async(engine, statements, max_workers=None):
+    loop = asyncio.get_running_loop()
+    names = list(statements)
+    with ThreadPoolExecutor(max_workers or engine.pool.size()) as executor:
+        results = await asyncio.gather(*[loop.run_in_executor(executor, fetch_pooled, engine, statements[name])
+                                         for name in names])
+    return dict(zip(names, results))
+
+# Create a pooled engine for the census database: pooled_engine
+pooled_engine = create_pooled_engine('sqlite:///census.sqlite')
+
+# Make an alias of the employees table: managers
+managers = employees.alias()
+
+# Fire the report queries at once
+reports = run_concurrently(pooled_engine, {
+    'state_fact_join': select([census, state_fact]).select_from(
+        census.join(state_fact, census.columns.state == state_fact.columns.name)),
+    'managers': select([managers.columns.name.label('manager'),
+                        employees.columns.name.label('employee')]
+                       ).where(managers.columns.id == employees.columns.mgr
+                       ).order_by(managers.columns.name),
+    'percent_female': select([census.columns.state,
+        (func.sum(case([(census.columns.sex == 'F', census.columns.pop2000)], else_=0)) /
+         cast(func.sum(census.columns.pop2000), Float) * 100).label('percent_female')
+    ]).group_by(census.columns.state),
+})
+for name, rows in reports.items():
+    print(name, len(rows))
+
+# Import inspect, Index and the expression visitors
+from sqlalchemy import inspect, Index
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.expression import BinaryExpression, Join
+
+# Define an advisor that indexes the columns queries filter and join on
+class IndexAdvisor:
+    """Record the predicate and join columns of statements, check their SQLite
+    query plans for full scans and create the indexes that are missing."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.wanted = []
+
+    def record(self, stmt):
+        """Return the (table, columns) index candidates of stmt and remember them."""
+        clauses = [getattr(stmt, '_whereclause', None)]
+        for from_ in getattr(stmt, 'froms', []):
+            if isinstance(from_, Join):
+                clauses.append(from_.onclause)
+
+        equal, ranged, joined = {}, {}, []
+        for clause in clauses:
+            if clause is None:
+                continue
+            for element in visitors.iterate(clause, {}):
+                if not isinstance(element, BinaryExpression):
+                    continue
+                sides = [side for side in (element.left, element.right)
+                         if isinstance(side, Column) and isinstance(side.table, Table)]
+                if len(sides) == 2:
+                    # A join probes each side by itself
+                    joined.extend((side.table, (side.name,)) for side in sides)
+                elif len(sides) == 1:
+                    column = sides[0]
+                    group = equal if element.operator in (operators.eq, operators.in_op) else ranged
+                    group.setdefault(column.table, []).append(column.name)
+
+        # Equality columns first, then one range column, per table
+        candidates = joined + [(table, tuple(dict.fromkeys(equal.get(table, []) + ranged.get(table, [])[:1])))
+                               for table in set(equal) | set(ranged)]
+        for candidate in candidates:
+            if candidate not in self.wanted:
+                self.wanted.append(candidate)
+        return candidates
+
+    def missing(self, candidates):
+        # Skip candidates covered by the leading columns of an existing index
+        inspector = inspect(self.engine)
+        missing = []
+        for table, columns in candidates:
+            existing = [tuple(index['column_names'][:len(columns)]) for index in inspector.get_indexes(table.name)]
+            if columns not in existing:
+                missing.append((table, columns))
+        return missing
+
+    def plan(self, stmt):
+        compiled = stmt.compile(dialect=self.engine.dialect)
+        params = [compiled.params[name] for name in compiled.positiontup]
+        with self.engine.connect() as conn:
+            return [row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + str(compiled), params)]
+
+    def time(self, stmt):
+        # Writes run inside a transaction that is rolled back, so timing keeps the data
+        with self.engine.connect() as conn:
+            transaction = conn.begin()
+            start = time.perf_counter()
+            result = conn.execute(stmt)
+            if result.returns_rows:
+                result.fetchall()
+            seconds = time.perf_counter() - start
+            transaction.rollback()
+        return seconds
+
+    def apply(self, statements):
+        """Index the candidates of statements and return, for each statement,
+        its plan and timing before and after, and the indexes created."""
+
+        report = {}
+        for name, stmt in statements.items():
+            report[name] = {'before': self.plan(stmt), 'before_seconds': self.time(stmt), 'created': []}
+            for table, columns in self.missing(self.record(stmt)):
+                index = Index('ix_{}_{}'.format(table.name, '_'.join(columns)),
+                              *[table.columns[column] for column in columns])
+                index.create(self.engine)
+                report[name]['created'].append(index.name)
+        for name, stmt in statements.items():
+            report[name]['after'] = self.plan(stmt)
+            report[name]['after_seconds'] = self.time(stmt)
+        return report
+
+# Create an index advisor for the census engine: index_advisor
+index_advisor = IndexAdvisor(engine)
+
+# Index the delete predicate and the census/state_fact join and print the report
+index_report = index_advisor.apply({
+    'delete_m_36': delete(census).where(and_(census.columns.sex == 'M', census.columns.age == 36)),
+    'state_fact_join': select([census, state_fact]).select_from(
+        census.join(state_fact, census.columns.state == state_fact.columns.name)),
+    'in_states': select([census]).where(census.columns.state.in_(['New York', 'California', 'Texas'])),
+    'fips': select([state_fact]).where(state_fact.columns.fips_state == '36'),
+    'managers': select([employees.columns.name]).where(employees.columns.mgr == 7),
+})
+for name, entry in index_report.items():
+    print(name, entry['created'])
+    print('  before: {} ({:.4f}s)'.format(entry['before'], entry['before_seconds']))
+    print('  after:  {} ({:.4f}s)'.format(entry['after'], entry['after_seconds']))
+
+# Import numpy and the SQLAlchemy types used to choose dtypes
+import numpy as np
+from sqlalchemy import Boolean
+from sqlalchemy.types import Numeric
+
+# Define a function that picks the NumPy dtype of a reflected column
+def column_dtype(column):
+    if isinstance(column.type, Boolean):
+        return np.dtype('bool')
+    if isinstance(column.type, Integer):
+        return np.dtype('int64')
+    if isinstance(column.type, (Float, Numeric)):
+        return np.dtype('float64')
+    return np.dtype('object')
+
+# Define a function that copies one batch of row tuples into column buffers
+def fill_buffers(buffers, masks, start, batch):
+    for i, values in enumerate(zip(*batch)):
+        stop = start + len(values)
+        if buffers[i].dtype.kind in 'ib':
+            # Integers and booleans keep NULLs in a mask instead of turning into floats
+            missing = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+            if missing.any():
+                masks[i][start:stop] = missing
+                values = [0 if value is None else value for value in values]
+        buffers[i][start:stop] = values
+
+# Define a function that turns column buffers into a DataFrame
+def buffers_to_frame(columns, buffers, masks):
+    # Nullable integer and boolean columns always get pandas' masked dtypes, so
+    # every chunk of a column has the same dtype whether or not it holds a NULL
+    frame = {}
+    for column, buffer, mask in zip(columns, buffers, masks):
+        nullable = getattr(column, 'nullable', True)
+        if buffer.dtype.kind in 'ib' and not nullable and mask.any():
+            raise ValueError("NULL in NOT NULL column {!r}".format(column.name))
+        if buffer.dtype.kind == 'i' and nullable:
+            frame[column.name] = pd.arrays.IntegerArray(buffer, mask)
+        elif buffer.dtype.kind == 'b' and nullable:
+            frame[column.name] = pd.arrays.BooleanArray(buffer, mask)
+        else:
+            frame[column.name] = buffer
+    return pd.DataFrame(frame, copy=False)
+
+# Define a generator that streams a select statement as DataFrame chunks
+def iter_frames(connection, stmt, batch_size=10000):
+    """Generator function that runs stmt and yields DataFrames of up to
+    batch_size rows, filled straight from the DBAPI cursor's tuples into
+    column buffers typed from the statement's (reflected) column types."""
+
+    columns = list(stmt.columns)
+    dtypes = [column_dtype(column) for column in columns]
+
+    compiled = stmt.compile(connection)
+    cursor = connection.connection.cursor()
+    cursor.execute(str(compiled), [compiled.params[name] for name in compiled.positiontup])
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        buffers = [np.empty(len(batch), dtype) for dtype in dtypes]
+        masks = [np.zeros(len(batch), bool) for _ in dtypes]
+        fill_buffers(buffers, masks, 0, batch)
+        yield buffers_to_frame(columns, buffers, masks)
+    cursor.close()
+
+# Define a function that copies column buffers into ones of a new capacity
+def resize_buffers(buffers, masks, start, capacity):
+    for i in range(len(buffers)):
+        buffer = np.empty(capacity, buffers[i].dtype)
+        buffer[:start] = buffers[i][:start]
+        mask = np.zeros(capacity, bool)
+        mask[:start] = masks[i][:start]
+        buffers[i], masks[i] = buffer, mask
+
+# Define a function that reads a select statement into one DataFrame
+def read_frame(connection, stmt, batch_size=10000):
+    # Run the query once and double the column buffers whenever a batch overflows them
+    columns = list(stmt.columns)
+    buffers = [np.empty(batch_size, column_dtype(column)) for column in columns]
+    masks = [np.zeros(batch_size, bool) for _ in columns]
+
+    compiled = stmt.compile(connection)
+    cursor = connection.connection.cursor()
+    cursor.execute(str(compiled), [compiled.params[name] for name in compiled.positiontup])
+    start = 0
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        if start + len(batch) > len(buffers[0]):
+            resize_buffers(buffers, masks, start, max(2 * len(buffers[0]), start + len(batch)))
+        fill_buffers(buffers, masks, start, batch)
+        start += len(batch)
+    cursor.close()
+
+    # Trim the spare capacity off the end
+    resize_buffers(buffers, masks, start, start)
+    return buffers_to_frame(columns, buffers, masks)
+
+# Read the state populations into a DataFrame without fetchall
+pop2008_sum = func.sum(census.columns.pop2008).label('population')
+stmt = select([census.columns.state, pop2008_sum]).group_by(census.columns.state)
+df = read_frame(connection, stmt)
+print(df.dtypes)
+
+# Stream the census table as DataFrame chunks
+for chunk in iter_frames(connection, select([census]), batch_size=50000):
+    print(chunk.shape)
+
+# Import os, pickle and re
+import os
+import pickle
+import re
+
+# Define a cache of reflected table metadata kept on disk
+class SchemaCache:
+    """Reflect every table of an engine once and keep the MetaData in a pickle
+    file keyed by the database's schema version (PRAGMA schema_version on
+    SQLite). create_all, create, drop and drop_all on the engine drop the file."""
+
+    def __init__(self, engine, cache_dir='.schema_cache'):
+        self.engine = engine
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, re.sub(r'\W+', '_', str(engine.url)) + '.pickle')
+        self.cached = None
+        event.listen(Table, 'after_create', self.after_ddl)
+        event.listen(Table, 'after_drop', self.after_ddl)
+
+    def after_ddl(self, table, connection, **kw):
+        if str(connection.engine.url) == str(self.engine.url):
+            self.invalidate()
+
+    def invalidate(self):
+        self.cached = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def schema_version(self):
+        # Other backends have no cheap version number, so only the DDL events invalidate them
+        if self.engine.dialect.name != 'sqlite':
+            return None
+        with self.engine.connect() as conn:
+            return conn.execute('PRAGMA schema_version').scalar()
+
+    @property
+    def metadata(self):
+        version = self.schema_version()
+        if self.cached is None and os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                self.cached = pickle.load(f)
+        if self.cached is None or self.cached['schema_version'] != version:
+            # Reflect all tables in one go and save them for the next start
+            metadata = MetaData()
+            metadata.reflect(bind=self.engine)
+            self.cached = {'schema_version': version, 'metadata': metadata}
+            with open(self.path, 'wb') as f:
+                pickle.dump(self.cached, f)
+        return self.cached['metadata']
+
+    def table(self, name):
+        return self.metadata.tables[name]
+
+    def table_names(self):
+        return sorted(self.metadata.tables)
+
+    def exists(self, name):
+        return name in self.metadata.tables
+
+# Create a schema cache for the census engine: schema_cache
+schema_cache = SchemaCache(engine)
+
+# Get the census table and the table names without reflecting them again
+census = schema_cache.table('census')
+print(repr(census))
+print(schema_cache.table_names())
+
+# Check to see if state_fact exists
+print(schema_cache.exists('state_fact'))
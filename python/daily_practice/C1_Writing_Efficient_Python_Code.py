@@ -115,3 +115,174 @@ print(star_wars_heroes_np)
 print(star_wars_heroes_np)
 print(star_wars_heroes_np)
 
+
+# Import numpy as np and pandas as pd
+import numpy as np
+import pandas as pd
+
+# Define a filter that indexes publishers once and answers lookups by slicing
+class PublisherFilter:
+    """Index heroes by publisher once, so each lookup
+    is a slice instead of a scan over all publishers."""
+
+    def __init__(self, heroes, publishers):
+        # Factorize publishers into labels and an integer code array; a missing
+        # publisher (None) gets a code of its own, so get(None) finds its heroes
+        self.codes, labels = pd.factorize(np.asarray(publishers, dtype=object), use_na_sentinel=False)
+        self.labels = pd.Index(labels)
+
+        # Group the heroes by code so each publisher's heroes are contiguous
+        order = np.argsort(self.codes, kind='stable')
+        self.heroes = np.asarray(heroes)[order]
+
+        # Offsets of each publisher's slice in the grouped heroes
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(self.codes, minlength=len(self.labels)))))
+
+    def code(self, publisher):
+        # Hash lookup of the label, -1 if the publisher is unknown
+        return self.labels.get_indexer([publisher])[0]
+
+    def get(self, publisher):
+        # Slice out the heroes of one publisher
+        code = self.code(publisher)
+        if code < 0:
+            return self.heroes[:0]
+        return self.heroes[self.offsets[code]:self.offsets[code + 1]]
+
+    def get_many(self, publishers):
+        # Concatenate the slices of several publishers
+        return np.concatenate([self.heroes[:0]] + [self.get(p) for p in publishers])
+
+# Build the filter once for the whole roster: publisher_filter
+publisher_filter = PublisherFilter(heroes, publishers)
+
+# Use publisher_filter to gather Star Wars heroes
+star_wars_heroes_idx = publisher_filter.get('George Lucas')
+print(star_wars_heroes_idx)
+
+# Gather the heroes of several publishers in a single lookup
+lucas_marvel_heroes = publisher_filter.get_many(['George Lucas', 'Marvel Comics'])
+print(lucas_marvel_heroes)
+
+# Import the modules used to time and measure the variants
+import json
+import os
+import platform
+import timeit
+import tracemalloc
+
+# Define the variants that do the same job in different ways
+def filter_while(names):
+    new_list = []
+    i = 0
+    while i < len(names):
+        if len(names[i]) >= 6:
+            new_list.append(names[i])
+        i += 1
+    return new_list
+
+def filter_for(names):
+    better_list = []
+    for name in names:
+        if len(name) >= 6:
+            better_list.append(name)
+    return better_list
+
+def filter_comp(names):
+    return [name for name in names if len(name) >= 6]
+
+def upper_map(names):
+    return [*map(str.upper, names)]
+
+def upper_comp(names):
+    return [name.upper() for name in names]
+
+def range_unpack(n):
+    return [*range(n)]
+
+def range_list(n):
+    return list(range(n))
+
+def double_comp(nums):
+    return [num * 2 for num in nums]
+
+def double_np(nums):
+    return nums * 2
+
+# Repeat names until the list holds n names
+def make_names(n):
+    return [names[i % len(names)] for i in range(n)]
+
+# Pair each variant with a function that builds its input of size n
+c1_variants = {
+    'filter_while': (filter_while, make_names),
+    'filter_for': (filter_for, make_names),
+    'filter_comp': (filter_comp, make_names),
+    'upper_map': (upper_map, make_names),
+    'upper_comp': (upper_comp, make_names),
+    'range_unpack': (range_unpack, lambda n: n),
+    'range_list': (range_list, lambda n: n),
+    'double_comp': (double_comp, lambda n: list(range(n))),
+    'double_np': (double_np, lambda n: np.arange(n)),
+}
+
+# Define a function that times each variant and measures its peak memory
+def run_benchmarks(sizes=(10**3, 10**4, 10**5), repeat=3):
+    """Return the best time (seconds) and peak memory (bytes)
+    of every variant at every size in sizes."""
+
+    results = {}
+    for label, (func, make_input) in c1_variants.items():
+        results[label] = {}
+        for n in sizes:
+            data = make_input(n)
+
+            # Take the best of repeat runs so noise does not inflate the time
+            best = min(timeit.repeat(lambda: func(data), number=1, repeat=repeat))
+
+            # Trace a separate run so tracing does not slow down the timing
+            tracemalloc.start()
+            func(data)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            results[label][str(n)] = {'seconds': best, 'peak_bytes': peak}
+    return results
+
+# Define a function that saves results with the versions they were run on
+def save_baseline(results, path='c1_baseline.json'):
+    baseline = {'python': platform.python_version(),
+                'numpy': np.__version__,
+                'results': results}
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+
+# Define a function that lists the variants slower than the baseline
+def compare_to_baseline(results, path='c1_baseline.json', tolerance=1.25):
+    with open(path) as f:
+        baseline = json.load(f)['results']
+    regressions = []
+    for label, by_size in results.items():
+        for n, stats in by_size.items():
+            old = baseline.get(label, {}).get(n)
+            if old and stats['seconds'] > old['seconds'] * tolerance:
+                regressions.append((label, n, old['seconds'], stats['seconds']))
+    return regressions
+
+# Set these to True to run the slow 10^6 and 10^7 sizes, or to replace the saved baseline
+full_sweep = False
+update_baseline = False
+
+# Run the benchmarks and print the fastest variant of each job per size
+c1_results = run_benchmarks((10**3, 10**4, 10**5, 10**6, 10**7) if full_sweep else (10**3, 10**4, 10**5))
+for job in ('filter', 'upper', 'range', 'double'):
+    for n in c1_results['range_list']:
+        timings = {label: c1_results[label][n]['seconds'] for label in c1_results if label.startswith(job)}
+        print(job, n, min(timings, key=timings.get), timings)
+
+# Compare with the saved baseline, and save one only when there is none or when asked
+if update_baseline or not os.path.exists('c1_baseline.json'):
+    save_baseline(c1_results)
+else:
+    for label, n, old, new in compare_to_baseline(c1_results):
+        print('regression: {} at {} went from {:.6f}s to {:.6f}s'.format(label, n, old, new))